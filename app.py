@@ -3,71 +3,488 @@ Cloud-Based Video Streaming Application with User Authentication
 A complete video upload, management, and streaming platform with user login
 
 Requirements:
-pip install flask flask-cors werkzeug pillow bcrypt
+pip install flask flask-cors werkzeug pillow bcrypt argon2-cffi streaming-form-data orjson
+
+Optional: pip install Flask-Session redis, then set REDIS_URL for server-side sessions
 
 Run: python app.py
+Production: gunicorn --worker-class gthread --workers 2 --threads 8 -b 0.0.0.0:5000 app:app
 Access: http://localhost:5000
 """
 
-from flask import Flask, render_template_string, request, jsonify, send_file, Response, session, redirect, url_for
+from flask import Flask, request, jsonify, send_file, Response, session, redirect, url_for
 from werkzeug.utils import secure_filename
+from streaming_form_data import StreamingFormDataParser
+from streaming_form_data.parser import ParseFailedException
+from streaming_form_data.targets import FileTarget
 import os
-import json
-from datetime import datetime
-import mimetypes
-import bcrypt
+import orjson
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 import secrets
+import uuid
+import threading
+import atexit
+import time
+import re
+import fcntl
+import hashlib
+import gzip
+from functools import lru_cache
 
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(32)
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
 app.config['UPLOAD_FOLDER'] = 'uploads/videos'
-app.config['METADATA_FILE'] = 'uploads/metadata.json'
+app.config['METADATA_FILE'] = 'uploads/metadata.jsonl'
+app.config['LEGACY_METADATA_FILE'] = 'uploads/metadata.json'
 app.config['USERS_FILE'] = 'uploads/users.json'
-
-# Ensure upload directory exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+app.config['UPLOAD_PART_SIZE'] = 5 * 1024 * 1024  # resumable upload part size
+app.config['SECRET_KEY_FILE'] = 'uploads/secret_key'
+app.config['SESSION_PERMANENT'] = True
+app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30)
+# Only send the session cookie (or write the Redis session) when it changes,
+# not on every response
+app.config['SESSION_REFRESH_EACH_REQUEST'] = False
+app.config['ARGON2_TIME_COST'] = 2
+app.config['ARGON2_MEMORY_COST'] = 19 * 1024  # KiB
+# When running behind nginx, hand video delivery off to it, e.g. with
+# X_ACCEL_REDIRECT_PREFIX=/internal_videos/ and:
+#   location /internal_videos/ { internal; alias /path/to/uploads/videos/; }
+app.config['X_ACCEL_REDIRECT_PREFIX'] = os.environ.get('X_ACCEL_REDIRECT_PREFIX')
+
+def _read_secret_key(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ''
+
+def load_secret_key():
+    # A stable key keeps sessions valid across restarts, so returning users
+    # don't all have to log in (and hit the password hasher) again
+    key = os.environ.get('FLASK_SECRET_KEY')
+    if key:
+        return key
+    
+    path = app.config['SECRET_KEY_FILE']
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    key = _read_secret_key(path)
+    if key:
+        return key
+    
+    # The key is written to a temp file and linked into place, so the key file
+    # never exists half-written and concurrent workers all end up with the
+    # first one linked
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(secrets.token_hex(32))
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        os.link(temp_path, path)
+    except FileExistsError:
+        if not _read_secret_key(path):
+            # An empty key file left behind by an interrupted start
+            os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return _read_secret_key(path)
+
+app.secret_key = load_secret_key()
+
+# With Redis configured, sessions live server-side and each request carries
+# only a session id cookie instead of the signed session payload
+if os.environ.get('REDIS_URL'):
+    import redis
+    from flask_session import Session
+    app.config['SESSION_TYPE'] = 'redis'
+    app.config['SESSION_REDIS'] = redis.Redis.from_url(os.environ['REDIS_URL'])
+    Session(app)
 
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm'}
+_ALLOWED_SUFFIXES = tuple('.' + ext for ext in ALLOWED_EXTENSIONS)
+_RANGE_RE = re.compile(r'bytes=(\d+)-(\d*)')
+_VIDEO_MIME = {
+    'mp4': 'video/mp4',
+    'webm': 'video/webm',
+    'mkv': 'video/x-matroska',
+    'mov': 'video/quicktime',
+    'avi': 'video/x-msvideo'
+}
+UPLOAD_CHUNK_SIZE = 64 * 1024  # bytes read from the request stream per parser call
+PART_WRITE_SIZE = 1024 * 1024  # bytes per os.pwrite when storing a resumable upload part
+LIVE_POLL_INTERVAL = 0.05  # seconds between checks for new bytes of an in-progress upload
+LIVE_STALL_TIMEOUT = 30  # give up following an upload that stopped receiving data
+UPLOAD_EXPIRY = 6 * 60 * 60  # seconds without new bytes after which an in-progress upload is abandoned
+LIVE_RANGE_MAX = 8 * 1024 * 1024  # most bytes answered per Range request on an in-progress upload
+READAHEAD_WINDOW = 8 * 1024 * 1024  # bytes the kernel is asked to prefetch from where a stream starts
+METADATA_FLUSH_DELAY = 0.01  # seconds a burst of metadata changes may gather before it is written
+METADATA_BATCH_ROWS = 256  # pending rows that are written right away without waiting out the delay
+METADATA_SYNC_TIMEOUT = 5  # seconds a request waits for its metadata rows to reach the log
+METADATA_RETRY_DELAY = 0.5  # first back-off after a failed metadata write, doubled up to the max
+METADATA_RETRY_MAX = 30
+METADATA_COMPACT_SLACK = 100  # superseded log rows tolerated before rewriting the log
+BACKFILLED_FIELDS = {'size_bytes', 'owner_name', 'uploaded_at'}
+
+# argon2 and bcrypt release the GIL, so request threads would hash in parallel
+# anyway; the pool caps how many memory-hard hashes run at once at one per core,
+# which bounds the memory and CPU a burst of logins can take
+auth_executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+password_hasher = PasswordHasher(
+    time_cost=app.config['ARGON2_TIME_COST'],
+    memory_cost=app.config['ARGON2_MEMORY_COST'],
+    parallelism=1
+)
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(_ALLOWED_SUFFIXES)
+
+def video_mimetype(filename):
+    return _VIDEO_MIME.get(filename.rsplit('.', 1)[-1].lower(), 'application/octet-stream')
+
+# Parsed JSON stores, reused until the file on disk is replaced (a new inode)
+# or rewritten (a new mtime)
+_store_lock = threading.Lock()
+_write_lock = threading.Lock()
+_users_cache = {'key': None, 'data': None}
+# The metadata log is replayed incrementally: 'offset' is how far into the
+# file (identified by 'ino') has been applied, 'rows' how many rows that was
+# 'queued' and 'flushed' count rows ever queued and ever written by this process
+_metadata_cache = {'data': None, 'ino': None, 'offset': 0, 'rows': 0, 'pending': [], 'writer': None,
+                   'queued': 0, 'flushed': 0}
+# Signalled when rows are queued and when they are written; both share
+# _store_lock, which guards 'pending' and the counters
+_metadata_queued = threading.Condition(_store_lock)
+_metadata_flushed = threading.Condition(_store_lock)
+# username/email -> user_id, rebuilt whenever the cached users dict is replaced or saved
+_user_index = {'users': None, 'username': {}, 'email': {}}
+
+def _load_json(path, cache):
+    with _store_lock:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return {}
+        key = (st.st_ino, st.st_mtime_ns)
+        if cache['data'] is None or cache['key'] != key:
+            with open(path, 'rb') as f:
+                cache['data'] = orjson.loads(f.read())
+            cache['key'] = key
+        return cache['data']
+
+def _write_temp_file(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    return temp_path
+
+def _write_json_atomic(path, payload):
+    # Write a sibling temp file and rename it over the store so a crash
+    # mid-write never leaves a truncated file behind
+    os.replace(_write_temp_file(path, payload), path)
+    return os.stat(path)
 
 def load_users():
-    if os.path.exists(app.config['USERS_FILE']):
-        with open(app.config['USERS_FILE'], 'r') as f:
-            return json.load(f)
-    return {}
-
-def save_users(users):
-    os.makedirs(os.path.dirname(app.config['USERS_FILE']), exist_ok=True)
-    with open(app.config['USERS_FILE'], 'w') as f:
-        json.dump(users, f, indent=2)
+    return _load_json(app.config['USERS_FILE'], _users_cache)
+
+def save_user(user):
+    # Read, modify and write under an flock, re-reading the file once the
+    # lock is held, so workers never overwrite each other's users. The change
+    # goes into a copy: threads still iterating the cached dict (e.g. in
+    # get_user_index) never see it change.
+    # Returns False if another user took the username or email meanwhile.
+    path = app.config['USERS_FILE']
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _write_lock:
+        fd = os.open(f"{path}.lock", os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            users = dict(_load_json(path, _users_cache))
+            for field in ('username', 'email'):
+                if get_user_index(field).get(user[field], user['id']) != user['id']:
+                    return False
+            users[user['id']] = user
+            st = _write_json_atomic(path, orjson.dumps(users, option=orjson.OPT_INDENT_2))
+            with _store_lock:
+                _users_cache.update(key=(st.st_ino, st.st_mtime_ns), data=users)
+                _user_index['users'] = None
+        finally:
+            os.close(fd)
+    return True
+
+def get_user_index(field):
+    users = load_users()
+    with _store_lock:
+        if _user_index['users'] is not users:
+            _user_index['username'] = {user['username']: user_id for user_id, user in users.items()}
+            _user_index['email'] = {user['email']: user_id for user_id, user in users.items()}
+            _user_index['users'] = users
+        return _user_index[field]
+
+# Video metadata is an append-only JSON Lines log: each row is a full video
+# entry, a {'id', 'deleted'} tombstone, or an {'id', 'part'} note that a part
+# of a resumable upload arrived. The last full row for an id wins.
+def _add_upload_part(data, video_id, part):
+    video = data.get(video_id)
+    if video is not None and video.get('status') == 'uploading' and part not in video.get('parts', ()):
+        data[video_id] = dict(video, parts=sorted([*video.get('parts', ()), part]))
+
+def _apply_metadata_rows(data, payload):
+    rows = 0
+    for line in payload.splitlines():
+        try:
+            row = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            # e.g. the torn tail of a crashed append; it is counted so a
+            # later compaction drops it
+            app.logger.warning('Skipping unreadable metadata row: %.80r', line)
+            rows += 1
+            continue
+        if row.get('deleted'):
+            data.pop(row['id'], None)
+        elif 'part' in row:
+            # Parts may be stored by different workers, so they are merged
+            # rather than written as full rows
+            _add_upload_part(data, row['id'], row['part'])
+        else:
+            data[row['id']] = row
+        rows += 1
+    return rows
+
+def _migrate_legacy_metadata(path):
+    legacy_path = app.config['LEGACY_METADATA_FILE']
+    if not os.path.exists(legacy_path):
+        return
+    with open(legacy_path, 'rb') as f:
+        legacy = orjson.loads(f.read())
+    temp_path = _write_temp_file(path, b''.join(orjson.dumps(video) + b'\n' for video in legacy.values()))
+    try:
+        # Linked rather than renamed into place: if another worker created the
+        # log meanwhile (and may already have appended to it), theirs is kept
+        os.link(temp_path, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(temp_path)
+
+def _load_metadata_locked():
+    cache = _metadata_cache
+    path = app.config['METADATA_FILE']
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        _migrate_legacy_metadata(path)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            if cache['data'] is None:
+                cache['data'] = {}
+            return cache['data']
+    
+    replayed = False
+    if cache['data'] is None or st.st_ino != cache['ino'] or st.st_size < cache['offset']:
+        # First load, or the log was compacted: replay it from the start
+        cache.update(data={}, ino=st.st_ino, offset=0, rows=0)
+        replayed = True
+    
+    if st.st_size > cache['offset']:
+        # Only the rows appended since the last load are read and applied
+        with open(path, 'rb') as f:
+            f.seek(cache['offset'])
+            tail = f.read(st.st_size - cache['offset'])
+        complete = tail.rfind(b'\n') + 1
+        cache['rows'] += _apply_metadata_rows(cache['data'], tail[:complete])
+        cache['offset'] += complete
+        replayed = True
+    
+    if replayed and cache['pending']:
+        # Other workers' rows were just applied under this worker's unflushed
+        # changes, which are newer; put those back on top
+        _apply_metadata_rows(cache['data'], b''.join(cache['pending']))
+    return cache['data']
 
 def load_metadata():
-    if os.path.exists(app.config['METADATA_FILE']):
-        with open(app.config['METADATA_FILE'], 'r') as f:
-            return json.load(f)
-    return {}
-
-def save_metadata(metadata):
-    os.makedirs(os.path.dirname(app.config['METADATA_FILE']), exist_ok=True)
-    with open(app.config['METADATA_FILE'], 'w') as f:
-        json.dump(metadata, f, indent=2)
-
-def get_file_size(filepath):
-    size = os.path.getsize(filepath)
-    for unit in ['B', 'KB', 'MB', 'GB']:
-        if size < 1024.0:
-            return f"{size:.1f} {unit}"
-        size /= 1024.0
-    return f"{size:.1f} TB"
+    with _store_lock:
+        return _load_metadata_locked()
+
+def _metadata_writer():
+    # Bursts of metadata changes (e.g. several uploads finishing together)
+    # are coalesced into one append and one fsync
+    retry_delay = METADATA_RETRY_DELAY
+    try:
+        while True:
+            with _metadata_queued:
+                pending = _metadata_cache['pending']
+                while not pending:
+                    _metadata_queued.wait()
+                deadline = time.monotonic() + METADATA_FLUSH_DELAY
+                while len(pending) < METADATA_BATCH_ROWS:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    _metadata_queued.wait(remaining)
+            try:
+                flush_metadata()
+            except Exception:
+                # The rows stay pending; keep retrying (e.g. until disk space
+                # is freed) instead of letting the writer die
+                app.logger.exception('Writing metadata failed, retrying in %.1fs', retry_delay)
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, METADATA_RETRY_MAX)
+            else:
+                retry_delay = METADATA_RETRY_DELAY
+    finally:
+        with _store_lock:
+            # Never leave a dead writer registered; the next queued row starts a new one
+            if _metadata_cache['writer'] is threading.current_thread():
+                _metadata_cache['writer'] = None
+
+def _queue_metadata_row(row):
+    # Called with _store_lock held; the request returns without waiting for the write
+    _metadata_cache['pending'].append(orjson.dumps(row) + b'\n')
+    _metadata_cache['queued'] += 1
+    writer = _metadata_cache['writer']
+    if writer is None or not writer.is_alive():
+        # Started on first use so each forked worker gets its own writer
+        writer = threading.Thread(target=_metadata_writer, name='metadata-writer', daemon=True)
+        _metadata_cache['writer'] = writer
+        writer.start()
+    _metadata_queued.notify()
+
+def sync_metadata():
+    # Waits until every row queued so far is in the log. Used for changes the
+    # client acts on right away, possibly on another worker; returns False if
+    # the log could not be written in time (the rows stay queued).
+    with _metadata_flushed:
+        target = _metadata_cache['queued']
+        return _metadata_flushed.wait_for(lambda: _metadata_cache['flushed'] >= target,
+                                          METADATA_SYNC_TIMEOUT)
+
+def save_video(video):
+    with _store_lock:
+        _load_metadata_locked()[video['id']] = video
+        _queue_metadata_row(video)
+
+def remove_video(video_id):
+    with _store_lock:
+        _load_metadata_locked().pop(video_id, None)
+        _queue_metadata_row({'id': video_id, 'deleted': True})
+
+def record_upload_part(video_id, part):
+    with _store_lock:
+        _add_upload_part(_load_metadata_locked(), video_id, part)
+        _queue_metadata_row({'id': video_id, 'part': part})
+
+def _compact_metadata_locked(path, fd):
+    # Called with the log's flock held, so nobody else is appending
+    cache = _metadata_cache
+    # Replaying first also picks up the inode of a log this process created
+    _load_metadata_locked()
+    if os.fstat(fd).st_ino != cache['ino']:
+        return
+    if cache['rows'] <= 2 * len(cache['data']) + METADATA_COMPACT_SLACK:
+        return
+    payload = b''.join(orjson.dumps(video) + b'\n' for video in cache['data'].values())
+    _write_json_atomic(path, payload)
+    cache.update(ino=os.stat(path).st_ino, offset=len(payload), rows=len(cache['data']))
+
+def _append_metadata_locked(fd, payload):
+    # Called with the log's flock held
+    start = os.fstat(fd).st_size
+    if start and os.pread(fd, 1, start - 1) != b'\n':
+        # A crash left a partial row; start on a fresh line so it only
+        # costs that row
+        payload = b'\n' + payload
+    try:
+        view = memoryview(payload)
+        while view:
+            view = view[os.write(fd, view):]
+        os.fsync(fd)
+    except OSError:
+        # e.g. ENOSPC: cut the partial rows off again so nothing is glued onto
+        # them later; the rows stay pending for the next flush
+        os.ftruncate(fd, start)
+        raise
+
+def flush_metadata():
+    path = app.config['METADATA_FILE']
+    # The batch is taken under _write_lock so the writer thread and the exit
+    # flush never append the same rows twice
+    with _write_lock:
+        with _store_lock:
+            pending = _metadata_cache['pending']
+            if not pending:
+                return
+            count = len(pending)
+            payload = b''.join(pending[:count])
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                if os.fstat(fd).st_ino != os.stat(path).st_ino:
+                    # Another worker compacted the log while we waited for the lock
+                    continue
+                _append_metadata_locked(fd, payload)
+                with _store_lock:
+                    # Rows queued while writing stay pending for the next flush
+                    del pending[:count]
+                    _metadata_cache['flushed'] += count
+                    _metadata_flushed.notify_all()
+                    if not pending:
+                        _compact_metadata_locked(path, fd)
+                break
+            finally:
+                os.close(fd)
+
+atexit.register(flush_metadata)
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def format_timestamp(epoch):
+    return time.strftime(TIMESTAMP_FORMAT, time.localtime(epoch))
+
+_SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
+
+def format_size(size):
+    # Pick the unit straight from the bit length instead of dividing in a loop
+    unit = min(max(size.bit_length() - 1, 0) // 10, len(_SIZE_UNITS) - 1)
+    return f"{size / (1 << (10 * unit)):.1f} {_SIZE_UNITS[unit]}"
+
+def is_legacy_hash(hashed):
+    # Accounts created before the switch to argon2 still carry bcrypt hashes
+    return hashed.startswith('$2')
+
+def _check_password(password, hashed):
+    if is_legacy_hash(hashed):
+        # Imported lazily so workers that never see a legacy hash skip loading it
+        import bcrypt
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    try:
+        return password_hasher.verify(hashed, password)
+    except (VerificationError, InvalidHashError):
+        return False
 
 def hash_password(password):
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return auth_executor.submit(password_hasher.hash, password).result()
 
 def check_password(password, hashed):
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    return auth_executor.submit(_check_password, password, hashed).result()
+
+@lru_cache(maxsize=1)
+def dummy_password_hash():
+    return password_hasher.hash(secrets.token_hex(16))
+
+def password_needs_rehash(hashed):
+    return is_legacy_hash(hashed) or password_hasher.check_needs_rehash(hashed)
 
 # Login/Register Page Template
 LOGIN_TEMPLATE = """
@@ -719,6 +1136,7 @@ APP_TEMPLATE = """
                         <div class="video-meta">📅 ${video.uploaded}</div>
                         <div class="video-meta">💾 ${video.size}</div>
                         <div class="video-meta">🎞️ ${video.format}</div>
+                        ${video.status === 'uploading' ? '<div class="video-meta">⏳ Uploading...</div>' : ''}
                         <div class="video-actions">
                             <button class="btn btn-small" onclick="playVideo('${video.id}', '${video.title}')">
                                 ▶️ Play
@@ -744,45 +1162,86 @@ APP_TEMPLATE = """
             });
         }
 
-        function uploadFile(file) {
-            const formData = new FormData();
-            formData.append('video', file);
+        const MAX_PART_ATTEMPTS = 3;
 
-            progressBar.style.display = 'block';
-            progressFill.style.width = '0%';
-            progressFill.textContent = '0%';
+        function checkResponse(response) {
+            if (!response.ok) {
+                return response.text().then(text => { throw new Error(text); });
+            }
+            return response.json();
+        }
 
-            const xhr = new XMLHttpRequest();
+        function setProgress(fraction) {
+            const percent = Math.min(100, Math.round(fraction * 100));
+            progressFill.style.width = percent + '%';
+            progressFill.textContent = percent + '%';
+        }
 
-            xhr.upload.addEventListener('progress', (e) => {
-                if (e.lengthComputable) {
-                    const percent = Math.round((e.loaded / e.total) * 100);
-                    progressFill.style.width = percent + '%';
-                    progressFill.textContent = percent + '%';
-                }
-            });
+        function uploadPart(file, upload, index, attempt = 1) {
+            const start = index * upload.part_size;
+            const blob = file.slice(start, start + upload.part_size);
 
-            xhr.addEventListener('load', () => {
-                if (xhr.status === 200) {
-                    showMessage('Video uploaded successfully!', 'success');
-                    setTimeout(() => {
-                        progressBar.style.display = 'none';
-                        fileInput.value = '';
-                        loadVideos();
-                    }, 1000);
-                } else {
-                    showMessage('Upload failed: ' + xhr.responseText, 'error');
-                    progressBar.style.display = 'none';
-                }
+            return new Promise((resolve, reject) => {
+                const xhr = new XMLHttpRequest();
+
+                xhr.upload.addEventListener('progress', (e) => {
+                    if (e.lengthComputable) {
+                        setProgress((start + e.loaded) / file.size);
+                    }
+                });
+
+                xhr.addEventListener('load', () => {
+                    if (xhr.status === 200) {
+                        resolve();
+                    } else {
+                        reject(new Error(xhr.responseText));
+                    }
+                });
+
+                xhr.addEventListener('error', () => {
+                    reject(new Error('Network error'));
+                });
+
+                xhr.open('PUT', `/upload/${encodeURIComponent(upload.upload_id)}/part/${index}`);
+                xhr.send(blob);
+            }).catch(error => {
+                // Only the failed part is sent again, not the whole file
+                if (attempt >= MAX_PART_ATTEMPTS) throw error;
+                return uploadPart(file, upload, index, attempt + 1);
             });
+        }
 
-            xhr.addEventListener('error', () => {
-                showMessage('Upload failed. Please try again.', 'error');
+        function uploadFile(file) {
+            progressBar.style.display = 'block';
+            setProgress(0);
+
+            fetch('/upload/init', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ filename: file.name, size: file.size })
+            })
+            .then(checkResponse)
+            .then(upload => {
+                const partCount = Math.ceil(file.size / upload.part_size);
+                let parts = Promise.resolve();
+                for (let i = 0; i < partCount; i++) {
+                    parts = parts.then(() => uploadPart(file, upload, i));
+                }
+                return parts.then(() => fetch(`/upload/${encodeURIComponent(upload.upload_id)}/finalize`, { method: 'POST' }));
+            })
+            .then(checkResponse)
+            .then(() => {
+                showMessage('Video uploaded successfully!', 'success');
+                setTimeout(() => {
+                    progressBar.style.display = 'none';
+                    fileInput.value = '';
+                    loadVideos();
+                }, 1000);
+            })
+            .catch(error => {
+                showMessage('Upload failed: ' + error.message, 'error');
                 progressBar.style.display = 'none';
             });
-
-            xhr.open('POST', '/upload');
-            xhr.send(formData);
         }
 
         function showMessage(text, type) {
@@ -809,19 +1268,8 @@ APP_TEMPLATE = """
         function updateStats(videos) {
             document.getElementById('videoCount').textContent = videos.length;
             
-            let totalBytes = 0;
-            videos.forEach(video => {
-                const sizeStr = video.size;
-                const [value, unit] = sizeStr.split(' ');
-                const num = parseFloat(value);
-                
-                if (unit === 'GB') totalBytes += num * 1024;
-                else if (unit === 'MB') totalBytes += num;
-                else if (unit === 'KB') totalBytes += num / 1024;
-                else if (unit === 'B') totalBytes += num / (1024 * 1024);
-            });
-            
-            document.getElementById('totalSize').textContent = totalBytes.toFixed(2) + ' MB';
+            const totalBytes = videos.reduce((sum, video) => sum + video.size_bytes, 0);
+            document.getElementById('totalSize').textContent = (totalBytes / (1024 * 1024)).toFixed(2) + ' MB';
         }
 
         function playVideo(videoId, title) {
@@ -867,11 +1315,45 @@ APP_TEMPLATE = """
 </html>
 """
 
+# Compile the templates once at import instead of re-parsing them per request;
+# the login page has no variables so it is rendered up front as well
+LOGIN_HTML = app.jinja_env.from_string(LOGIN_TEMPLATE).render()
+LOGIN_BYTES = LOGIN_HTML.encode('utf-8')
+LOGIN_GZ = gzip.compress(LOGIN_BYTES, compresslevel=9)
+LOGIN_ETAG = hashlib.md5(LOGIN_BYTES).hexdigest()
+LOGIN_GZ_ETAG = LOGIN_ETAG + '-gz'
+APP_TMPL = app.jinja_env.from_string(APP_TEMPLATE)
+
+@lru_cache(maxsize=256)
+def render_dashboard(username):
+    # Only the username varies, so each user's page is rendered and compressed once
+    html = APP_TMPL.render(username=username).encode('utf-8')
+    return html, gzip.compress(html, compresslevel=9)
+
+def accepts_gzip():
+    return request.accept_encodings['gzip'] > 0
+
+def html_response(raw, compressed, headers):
+    if accepts_gzip():
+        headers['Content-Encoding'] = 'gzip'
+        return Response(compressed, mimetype='text/html', headers=headers)
+    return Response(raw, mimetype='text/html', headers=headers)
+
 @app.route('/')
 def index():
     if 'user_id' in session:
         return redirect(url_for('dashboard'))
-    return render_template_string(LOGIN_TEMPLATE)
+    
+    # The login page never changes, so let browsers revalidate it with a 304.
+    # It must still be revalidated every time since logged-in users get redirected.
+    headers = {'Cache-Control': 'private, no-cache', 'Vary': 'Cookie, Accept-Encoding'}
+    etag = LOGIN_GZ_ETAG if accepts_gzip() else LOGIN_ETAG
+    if request.if_none_match.contains(etag):
+        response = Response(status=304, headers=headers)
+    else:
+        response = html_response(LOGIN_BYTES, LOGIN_GZ, headers)
+    response.set_etag(etag)
+    return response
 
 @app.route('/dashboard')
 def dashboard():
@@ -884,7 +1366,7 @@ def dashboard():
         session.clear()
         return redirect(url_for('index'))
     
-    return render_template_string(APP_TEMPLATE, username=user['name'])
+    return html_response(*render_dashboard(user['name']), {'Vary': 'Accept-Encoding'})
 
 @app.route('/api/register', methods=['POST'])
 def register():
@@ -904,27 +1386,26 @@ def register():
     if len(password) < 6:
         return jsonify({'success': False, 'message': 'Password must be at least 6 characters'})
     
-    users = load_users()
-    
     # Check if username or email already exists
-    for user_id, user_data in users.items():
-        if user_data['username'] == username:
-            return jsonify({'success': False, 'message': 'Username already exists'})
-        if user_data['email'] == email:
-            return jsonify({'success': False, 'message': 'Email already registered'})
+    if username in get_user_index('username'):
+        return jsonify({'success': False, 'message': 'Username already exists'})
+    if email in get_user_index('email'):
+        return jsonify({'success': False, 'message': 'Email already registered'})
     
     # Create new user
-    user_id = f"user_{len(users) + 1}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-    users[user_id] = {
+    now = time.time()
+    user_id = secrets.token_hex(8)
+    saved = save_user({
         'id': user_id,
         'name': name,
         'email': email,
         'username': username,
         'password': hash_password(password),
-        'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    }
-    
-    save_users(users)
+        'created': format_timestamp(now)
+    })
+    if not saved:
+        # Registered on another worker while this password was being hashed
+        return jsonify({'success': False, 'message': 'Username or email already registered'})
     
     return jsonify({'success': True, 'message': 'Account created successfully! Please login.'})
 
@@ -941,21 +1422,21 @@ def login():
     users = load_users()
     
     # Find user by username
-    user_found = None
-    user_id = None
-    for uid, user_data in users.items():
-        if user_data['username'] == username:
-            user_found = user_data
-            user_id = uid
-            break
+    user_id = get_user_index('username').get(username)
+    user_found = users.get(user_id)
     
-    if not user_found:
+    # Unknown usernames are checked against a dummy hash so the response
+    # time doesn't reveal which usernames exist
+    stored_hash = user_found['password'] if user_found else dummy_password_hash()
+    if not check_password(password, stored_hash) or not user_found:
         return jsonify({'success': False, 'message': 'Invalid username or password'})
     
-    if not check_password(password, user_found['password']):
-        return jsonify({'success': False, 'message': 'Invalid username or password'})
+    # Upgrade bcrypt or outdated argon2 hashes now that we have the plain password
+    if password_needs_rehash(user_found['password']):
+        save_user(dict(user_found, password=hash_password(password)))
     
     # Set session
+    session.permanent = app.config['SESSION_PERMANENT']
     session['user_id'] = user_id
     session['username'] = user_found['username']
     
@@ -966,71 +1447,334 @@ def logout():
     session.clear()
     return jsonify({'success': True})
 
+# Uploads are registered with status 'uploading' while their bytes arrive in a
+# hidden temp file, then renamed into place once complete
+def register_upload(user_id, original_name, temp_name, expected_size=None):
+    filename = secure_filename(original_name)
+    # Taken from the original name: secure_filename can drop the dot
+    # (e.g. a title made only of non-ASCII characters)
+    ext = original_name.rsplit('.', 1)[1].lower()
+    now = time.time()
+    video_id = uuid.uuid4().hex
+    owner = load_users().get(user_id, {})
+    
+    video = {
+        'id': video_id,
+        'title': filename,
+        'original_filename': original_name,
+        'filename': temp_name,
+        'uploaded': format_timestamp(now),
+        'uploaded_at': int(now),
+        'size': format_size(0),
+        'size_bytes': 0,
+        'format': ext.upper(),
+        'user_id': user_id,
+        'owner_name': owner.get('name', 'Unknown User'),
+        'status': 'uploading'
+    }
+    if expected_size is not None:
+        video['expected_size'] = expected_size
+    save_video(video)
+    return video_id
+
+def complete_upload(video_id):
+    video = load_metadata().get(video_id)
+    if video is None:
+        # Deleted by its owner while it was still uploading
+        return False
+    temp_path = os.path.join(app.config['UPLOAD_FOLDER'], video['filename'])
+    # Fixed-length random name on disk; the uploaded name stays in metadata
+    stored_name = f"{secrets.token_hex(16)}.{video['format'].lower()}"
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], stored_name)
+    size = os.stat(temp_path).st_size
+    # Linked under the new name first and unlinked only once the new row is
+    # saved, so a stream reading either row finds its file
+    os.link(temp_path, filepath)
+    
+    # Cached rows are shared with other threads, so the update goes into a copy
+    finished = {key: value for key, value in video.items()
+                if key not in ('status', 'expected_size', 'parts')}
+    finished.update(filename=stored_name, size=format_size(size), size_bytes=size)
+    save_video(finished)
+    os.remove(temp_path)
+    return True
+
+def discard_upload(video_id, temp_path):
+    try:
+        os.remove(temp_path)
+    except FileNotFoundError:
+        pass
+    if video_id is not None:
+        remove_video(video_id)
+
+# Uploads whose client went away (tab closed, server restarted mid-upload)
+# would otherwise be listed as uploading forever. Every write to the temp
+# file bumps its mtime, so that is when the upload was last active.
+def expire_uploads(videos):
+    cutoff = time.time() - UPLOAD_EXPIRY
+    active = []
+    for video in videos:
+        if video.get('status') == 'uploading':
+            temp_path = os.path.join(app.config['UPLOAD_FOLDER'], video['filename'])
+            try:
+                last_write = os.stat(temp_path).st_mtime
+            except FileNotFoundError:
+                last_write = video.get('uploaded_at', 0)
+            if last_write < cutoff:
+                discard_upload(video['id'], temp_path)
+                continue
+        active.append(video)
+    return active
+
+class UploadTarget(FileTarget):
+    # Remembers whether the file part's closing boundary arrived, so a body
+    # cut off mid-file is not stored as a finished video
+    def __init__(self, filename):
+        super().__init__(filename)
+        self.complete = False
+    
+    def on_finish(self):
+        super().on_finish()
+        self.complete = True
+
 @app.route('/upload', methods=['POST'])
 def upload_video():
     if 'user_id' not in session:
         return 'Unauthorized', 401
     
-    if 'video' not in request.files:
-        return 'No video file provided', 400
+    user_id = session['user_id']
     
-    file = request.files['video']
-    if file.filename == '':
+    # Parse the multipart body in large blocks straight to disk instead of
+    # going through werkzeug's form parser and request.files
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    temp_name = f".upload_{secrets.token_hex(8)}.part"
+    temp_path = os.path.join(app.config['UPLOAD_FOLDER'], temp_name)
+    target = UploadTarget(temp_path)
+    video_id = None
+    completed = False
+    
+    try:
+        parser = StreamingFormDataParser(headers=request.headers)
+        parser.register('video', target)
+        
+        received = 0
+        while True:
+            chunk = request.stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            received += len(chunk)
+            if received > app.config['MAX_CONTENT_LENGTH']:
+                return 'File too large (Max 500MB)', 413
+            parser.data_received(chunk)
+            
+            if video_id is None and target.multipart_filename:
+                # Register the video as soon as its part starts so it can be
+                # watched while the rest of the body is still arriving
+                if not allowed_file(target.multipart_filename):
+                    return 'Invalid file type. Allowed: MP4, AVI, MOV, MKV, WEBM', 400
+                video_id = register_upload(user_id, target.multipart_filename, temp_name)
+        
+        if video_id is None:
+            return 'No video file provided', 400
+        
+        if not target.complete:
+            return 'Upload incomplete', 400
+        
+        if not complete_upload(video_id):
+            return 'Upload cancelled', 409
+        completed = True
+    except ParseFailedException:
+        return 'Malformed upload', 400
+    finally:
+        if not completed:
+            discard_upload(video_id, temp_path)
+    
+    return jsonify({'message': 'Video uploaded successfully', 'id': video_id}), 200
+
+# Resumable upload: the client sends the file as fixed-size parts that can be
+# retried individually, then asks the server to finalize it
+@app.route('/upload/init', methods=['POST'])
+def upload_init():
+    if 'user_id' not in session:
+        return 'Unauthorized', 401
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return 'Invalid request', 400
+    filename = data.get('filename', '')
+    size = data.get('size')
+    
+    if not isinstance(filename, str) or not filename:
         return 'No file selected', 400
     
-    if not allowed_file(file.filename):
+    if not allowed_file(filename):
         return 'Invalid file type. Allowed: MP4, AVI, MOV, MKV, WEBM', 400
     
-    filename = secure_filename(file.filename)
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    unique_filename = f"{session['user_id']}_{timestamp}_{filename}"
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+    # bool is a subclass of int, so true would otherwise pass as size 1
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        return 'Invalid file size', 400
     
-    file.save(filepath)
+    if size > app.config['MAX_CONTENT_LENGTH']:
+        return 'File too large (Max 500MB)', 413
     
-    # Save metadata
-    metadata = load_metadata()
-    video_id = unique_filename
-    metadata[video_id] = {
-        'id': video_id,
-        'title': filename,
-        'filename': unique_filename,
-        'uploaded': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        'size': get_file_size(filepath),
-        'format': filename.rsplit('.', 1)[1].upper(),
-        'user_id': session['user_id']
-    }
-    save_metadata(metadata)
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    temp_name = f".upload_{secrets.token_hex(8)}.part"
+    open(os.path.join(app.config['UPLOAD_FOLDER'], temp_name), 'wb').close()
+    video_id = register_upload(session['user_id'], filename, temp_name, expected_size=size)
+    # The parts may be sent to another worker, which has to find the upload
+    if not sync_metadata():
+        return 'Could not start the upload, please try again', 503
     
-    return jsonify({'message': 'Video uploaded successfully', 'id': video_id}), 200
+    return jsonify({'upload_id': video_id, 'part_size': app.config['UPLOAD_PART_SIZE']})
+
+def get_pending_upload(upload_id):
+    video = load_metadata().get(upload_id)
+    if not video or video.get('status') != 'uploading' or 'expected_size' not in video:
+        return None, ('Upload not found', 404)
+    if video.get('user_id') != session['user_id']:
+        return None, ('Unauthorized', 403)
+    return video, None
+
+@app.route('/upload/<upload_id>/part/<int:part>', methods=['PUT'])
+def upload_part(upload_id, part):
+    if 'user_id' not in session:
+        return 'Unauthorized', 401
+    
+    video, error = get_pending_upload(upload_id)
+    if error:
+        return error
+    
+    part_size = app.config['UPLOAD_PART_SIZE']
+    offset = part * part_size
+    if offset >= video['expected_size']:
+        return 'Part out of range', 400
+    limit = min(part_size, video['expected_size'] - offset)
+    
+    # Write the part at its own offset so parts can be retried or arrive in any order
+    fd = os.open(os.path.join(app.config['UPLOAD_FOLDER'], video['filename']), os.O_WRONLY)
+    try:
+        written = 0
+        while True:
+            chunk = request.stream.read(PART_WRITE_SIZE)
+            if not chunk:
+                break
+            if written + len(chunk) > limit:
+                return 'Part too large', 400
+            os.pwrite(fd, chunk, offset + written)
+            written += len(chunk)
+    finally:
+        os.close(fd)
+    
+    if written != limit:
+        return 'Part incomplete', 400
+    # Finalize may be handled by another worker, which has to see this part
+    record_upload_part(upload_id, part)
+    if not sync_metadata():
+        return 'Could not record the part, please try again', 503
+    
+    return jsonify({'success': True, 'received': written})
+
+@app.route('/upload/<upload_id>/finalize', methods=['POST'])
+def upload_finalize(upload_id):
+    if 'user_id' not in session:
+        return 'Unauthorized', 401
+    
+    video, error = get_pending_upload(upload_id)
+    if error:
+        return error
+    
+    # The file already has its full size once the last part is written, so
+    # completeness is checked against the parts that were recorded
+    part_count = -(-video['expected_size'] // app.config['UPLOAD_PART_SIZE'])
+    if len(video.get('parts', ())) != part_count:
+        return 'Upload incomplete', 400
+    
+    if not complete_upload(upload_id):
+        return 'Upload cancelled', 409
+    # The finished video is listed right after this on whichever worker
+    # answers; if the log is not writable yet the row stays queued
+    sync_metadata()
+    
+    return jsonify({'message': 'Video uploaded successfully', 'id': upload_id}), 200
+
+# Yields a file that is still being uploaded, waiting for new bytes until it
+# completes. Reads are fixed-size os.pread calls at an explicit offset, so each
+# viewer holds at most one chunk in memory and the client's pace sets the reads.
+def follow_upload(video_id, fd, offset=0, end=None):
+    try:
+        idle_since = time.monotonic()
+        while True:
+            length = UPLOAD_CHUNK_SIZE if end is None else min(UPLOAD_CHUNK_SIZE, end + 1 - offset)
+            if length <= 0:
+                break
+            # Check the status before reading so the final bytes are never missed
+            uploading = load_metadata().get(video_id, {}).get('status') == 'uploading'
+            chunk = os.pread(fd, length, offset)
+            if chunk:
+                offset += len(chunk)
+                idle_since = time.monotonic()
+                yield chunk
+            elif uploading and time.monotonic() - idle_since < LIVE_STALL_TIMEOUT:
+                time.sleep(LIVE_POLL_INTERVAL)
+            else:
+                break
+    finally:
+        os.close(fd)
+
+# Start reading the span a player asked for into the page cache before the
+# response gets to it. WILLNEED acts on the file, not the descriptor, so a
+# short-lived fd is enough.
+def prefetch_video(path, offset):
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return
+    try:
+        os.posix_fadvise(fd, offset, READAHEAD_WINDOW, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+# Videos stored before size_bytes, owner_name and uploaded_at were recorded
+# get them filled in once and written back
+def backfill_videos(videos):
+    if all(BACKFILLED_FIELDS <= video.keys() for video in videos):
+        return videos
+    
+    users = load_users()
+    with os.scandir(app.config['UPLOAD_FOLDER']) as entries:
+        sizes = {entry.name: entry.stat().st_size for entry in entries if entry.is_file()}
+    filled = []
+    for video in videos:
+        if not BACKFILLED_FIELDS <= video.keys():
+            # Cached rows are shared with other threads, so fill in a copy
+            video = dict(video)
+            video.setdefault('size_bytes', sizes.get(video['filename'], 0))
+            video.setdefault('owner_name', users.get(video['user_id'], {}).get('name', 'Unknown User'))
+            video.setdefault('uploaded_at', int(time.mktime(time.strptime(video['uploaded'], TIMESTAMP_FORMAT))))
+            save_video(video)
+        filled.append(video)
+    return filled
 
 @app.route('/videos/all', methods=['GET'])
 def get_all_videos():
     if 'user_id' not in session:
         return jsonify([])
     
-    metadata = load_metadata()
-    users = load_users()
-    
-    # Get all videos with owner information
-    all_videos = []
-    for video in metadata.values():
-        video_data = video.copy()
-        
-        # Get owner name
-        owner_id = video.get('user_id', '')
-        owner = users.get(owner_id, {})
-        video_data['owner_name'] = owner.get('name', 'Unknown User')
-        video_data['is_owner'] = (owner_id == session['user_id'])
-        
-        all_videos.append(video_data)
+    videos = expire_uploads(list(load_metadata().values()))
+    videos = backfill_videos(videos)
     
-    # Sort by upload date, newest first
-    all_videos.sort(key=lambda x: x.get('uploaded', ''), reverse=True)
+    # Owner names are stored with each video, so listing needs no users join;
+    # only is_owner is added per request
+    # The metadata log keeps videos in registration order, so newest first is
+    # just that order reversed; no sort is needed
+    user_id = session['user_id']
+    all_videos = [dict(video, is_owner=(video['user_id'] == user_id)) for video in reversed(videos)]
     
     return jsonify(all_videos)
 
-@app.route('/stream/<video_id>')
+@app.route('/stream/<video_id>', methods=['GET', 'HEAD'])
 def stream_video(video_id):
     if 'user_id' not in session:
         return 'Unauthorized', 401
@@ -1040,46 +1784,80 @@ def stream_video(video_id):
         return 'Video not found', 404
     
     # Allow all authenticated users to stream videos
-    video_path = os.path.join(app.config['UPLOAD_FOLDER'], metadata[video_id]['filename'])
-    
-    if not os.path.exists(video_path):
-        return 'Video file not found', 404
-    
-    # Support for video streaming with range requests
-    range_header = request.headers.get('Range', None)
-    
-    if not range_header:
-        return send_file(video_path)
-    
-    size = os.path.getsize(video_path)
-    byte_start = 0
-    byte_end = size - 1
-    
-    if range_header:
-        byte_start = int(range_header.split('=')[1].split('-')[0])
-        if '-' in range_header.split('=')[1]:
-            range_end = range_header.split('=')[1].split('-')[1]
-            if range_end:
-                byte_end = int(range_end)
+    filename = metadata[video_id]['filename']
+    video_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    mimetype = video_mimetype(metadata[video_id]['title'])
     
-    length = byte_end - byte_start + 1
-    
-    with open(video_path, 'rb') as f:
-        f.seek(byte_start)
-        data = f.read(length)
+    video = metadata[video_id]
+    if video.get('status') == 'uploading':
+        # Still arriving: send what is on disk so far with chunked transfer
+        # encoding and keep flushing new bytes until the upload completes.
+        # HEAD probes only get the headers, so the file is never opened for them.
+        if request.method == 'HEAD':
+            if not os.path.exists(video_path):
+                return 'Video file not found', 404
+            live_fd = None
+        else:
+            try:
+                live_fd = os.open(video_path, os.O_RDONLY)
+            except FileNotFoundError:
+                return 'Video file not found', 404
+            if hasattr(os, 'posix_fadvise'):
+                # follow_upload only ever reads forward
+                os.posix_fadvise(live_fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        
+        match = _RANGE_RE.match(request.headers.get('Range', ''))
+        if match and 'expected_size' in video:
+            # Resumable uploads know their final size, so players can seek
+            # within it while the rest is still arriving
+            size = video['expected_size']
+            byte_start = int(match.group(1))
+            byte_end = int(match.group(2)) if match.group(2) else size - 1
+            if byte_start >= size or byte_start > byte_end:
+                if live_fd is not None:
+                    os.close(live_fd)
+                return Response(status=416, headers={'Content-Range': f'bytes */{size}'})
+            # Open-ended or oversized ranges get a bounded slice; players
+            # continue from Content-Range
+            byte_end = min(byte_end, size - 1, byte_start + LIVE_RANGE_MAX - 1)
+            length = byte_end - byte_start + 1
+            
+            return Response(
+                iter(()) if live_fd is None else follow_upload(video_id, live_fd, byte_start, byte_end),
+                206,
+                mimetype=mimetype,
+                headers={
+                    'Content-Range': f'bytes {byte_start}-{byte_end}/{size}',
+                    'Accept-Ranges': 'bytes',
+                    'Content-Length': str(length),
+                    'Cache-Control': 'no-store'
+                }
+            )
+        
+        return Response(
+            iter(()) if live_fd is None else follow_upload(video_id, live_fd),
+            mimetype=mimetype,
+            headers={'Cache-Control': 'no-store'}
+        )
     
-    response = Response(
-        data,
-        206,
-        mimetype=mimetypes.guess_type(video_path)[0],
-        direct_passthrough=True
-    )
+    if app.config['X_ACCEL_REDIRECT_PREFIX']:
+        # nginx serves the bytes (and Range requests) itself via sendfile
+        return Response(headers={
+            'X-Accel-Redirect': app.config['X_ACCEL_REDIRECT_PREFIX'] + filename,
+            'Content-Type': mimetype
+        })
     
-    response.headers.add('Content-Range', f'bytes {byte_start}-{byte_end}/{size}')
-    response.headers.add('Accept-Ranges', 'bytes')
-    response.headers.add('Content-Length', str(length))
+    if request.method == 'GET':
+        match = _RANGE_RE.match(request.headers.get('Range', ''))
+        prefetch_video(video_path, int(match.group(1)) if match else 0)
     
-    return response
+    # send_file answers Range requests itself (206/416) and hands the open file
+    # to the server's wsgi.file_wrapper, so gunicorn can use sendfile() for it.
+    # Its own stat doubles as the existence check.
+    try:
+        return send_file(os.path.abspath(video_path), mimetype=mimetype, conditional=True)
+    except FileNotFoundError:
+        return 'Video file not found', 404
 
 @app.route('/delete/<video_id>', methods=['DELETE'])
 def delete_video(video_id):
@@ -1100,8 +1878,8 @@ def delete_video(video_id):
     if os.path.exists(video_path):
         os.remove(video_path)
     
-    del metadata[video_id]
-    save_metadata(metadata)
+    remove_video(video_id)
+    sync_metadata()
     
     return jsonify({'message': 'Video deleted successfully'})
 
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# app.py reads its secret key at import; keep tests from creating key files
+os.environ.setdefault('FLASK_SECRET_KEY', 'test')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
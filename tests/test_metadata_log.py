@@ -0,0 +1,168 @@
+import os
+import time
+
+import pytest
+
+import app as appmod
+
+
+@pytest.fixture
+def log_path(tmp_path, monkeypatch):
+    path = tmp_path / 'metadata.jsonl'
+    monkeypatch.setitem(appmod.app.config, 'METADATA_FILE', str(path))
+    monkeypatch.setitem(appmod.app.config, 'LEGACY_METADATA_FILE', str(tmp_path / 'metadata.json'))
+    restart_worker()
+    yield path
+    restart_worker()
+
+
+def restart_worker():
+    # Forget everything cached, as a freshly started worker would; holding
+    # _write_lock keeps the writer thread from being mid-flush meanwhile
+    with appmod._write_lock, appmod._store_lock:
+        appmod._metadata_cache['pending'].clear()
+        appmod._metadata_cache.update(data=None, ino=None, offset=0, rows=0,
+                                      flushed=appmod._metadata_cache['queued'])
+
+
+def save(video_id, **fields):
+    appmod.save_video(dict(fields, id=video_id))
+
+
+def test_replay_applies_updates_and_tombstones(log_path):
+    save('a', title='first')
+    save('b', title='second')
+    save('a', title='renamed')
+    appmod.remove_video('b')
+    appmod.flush_metadata()
+    
+    restart_worker()
+    assert appmod.load_metadata() == {'a': {'id': 'a', 'title': 'renamed'}}
+
+
+def test_replay_picks_up_rows_appended_by_another_worker(log_path):
+    save('a', title='first')
+    appmod.flush_metadata()
+    assert set(appmod.load_metadata()) == {'a'}
+    
+    with open(log_path, 'ab') as f:
+        f.write(b'{"id":"b","title":"other worker"}\n')
+    assert set(appmod.load_metadata()) == {'a', 'b'}
+
+
+def test_compaction_keeps_one_row_per_video(log_path, monkeypatch):
+    monkeypatch.setattr(appmod, 'METADATA_COMPACT_SLACK', 0)
+    for i in range(10):
+        save('a', n=i)
+    save('b', n=0)
+    appmod.remove_video('b')
+    appmod.flush_metadata()
+    
+    assert log_path.read_bytes().count(b'\n') == 1
+    restart_worker()
+    assert appmod.load_metadata() == {'a': {'id': 'a', 'n': 9}}
+
+
+def test_torn_tail_is_skipped(log_path):
+    save('a', title='first')
+    appmod.flush_metadata()
+    with open(log_path, 'ab') as f:
+        f.write(b'{"id":"b","ti')
+    
+    restart_worker()
+    assert set(appmod.load_metadata()) == {'a'}
+    
+    save('c', title='after the crash')
+    appmod.flush_metadata()
+    restart_worker()
+    assert set(appmod.load_metadata()) == {'a', 'c'}
+
+
+def test_failed_append_is_rolled_back_and_retried(log_path, monkeypatch):
+    save('a', title='first')
+    appmod.flush_metadata()
+    size = log_path.stat().st_size
+    
+    real_fsync = os.fsync
+    def failing_fsync(fd):
+        raise OSError(28, 'No space left on device')
+    monkeypatch.setattr(appmod.os, 'fsync', failing_fsync)
+    save('b', title='second')
+    with pytest.raises(OSError):
+        appmod.flush_metadata()
+    assert log_path.stat().st_size == size
+    
+    monkeypatch.setattr(appmod.os, 'fsync', real_fsync)
+    appmod.flush_metadata()
+    restart_worker()
+    assert set(appmod.load_metadata()) == {'a', 'b'}
+
+
+def test_writer_retries_after_a_failed_flush(log_path, monkeypatch):
+    monkeypatch.setattr(appmod, 'METADATA_RETRY_DELAY', 0.01)
+    real_fsync = os.fsync
+    failures = []
+    def fsync_failing_once(fd):
+        if not failures:
+            failures.append(fd)
+            raise OSError(5, 'Input/output error')
+        real_fsync(fd)
+    monkeypatch.setattr(appmod.os, 'fsync', fsync_failing_once)
+    
+    save('a', title='first')
+    save('b', title='second')
+    deadline = time.monotonic() + 5
+    while appmod._metadata_cache['pending'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    
+    assert failures
+    assert appmod._metadata_cache['writer'].is_alive()
+    restart_worker()
+    assert set(appmod.load_metadata()) == {'a', 'b'}
+
+
+def test_sync_waits_for_queued_rows(log_path):
+    save('a', title='first')
+    assert appmod.sync_metadata()
+    assert b'"first"' in log_path.read_bytes()
+
+
+def test_rows_from_another_worker_are_seen_with_own_rows_pending(log_path):
+    save('a', title='first')
+    appmod.flush_metadata()
+    
+    with appmod._write_lock:
+        # Keep the writer thread from flushing this worker's row meanwhile
+        save('b', title='this worker')
+        with open(log_path, 'ab') as f:
+            f.write(b'{"id":"c","title":"other worker"}\n')
+            f.write(b'{"id":"b","title":"older"}\n')
+        videos = appmod.load_metadata()
+    
+    assert set(videos) == {'a', 'b', 'c'}
+    assert videos['b']['title'] == 'this worker'
+
+
+def test_legacy_migration_keeps_a_log_another_worker_created(log_path, monkeypatch):
+    legacy_path = log_path.parent / 'metadata.json'
+    legacy_path.write_bytes(b'{"a": {"id": "a", "title": "legacy"}}')
+    
+    real_stat = os.stat
+    raced = []
+    def stat_with_race(path, *args, **kwargs):
+        # Another worker migrates and appends right after this one saw no log
+        if str(path) == str(log_path) and not raced:
+            raced.append(path)
+            log_path.write_bytes(b'{"id":"a","title":"legacy"}\n{"id":"b","title":"appended"}\n')
+            raise FileNotFoundError(path)
+        return real_stat(path, *args, **kwargs)
+    monkeypatch.setattr(appmod.os, 'stat', stat_with_race)
+    
+    assert set(appmod.load_metadata()) == {'a', 'b'}
+    assert not list(log_path.parent.glob('*.tmp'))
+
+
+def test_legacy_metadata_is_migrated(log_path):
+    (log_path.parent / 'metadata.json').write_bytes(b'{"a": {"id": "a", "title": "legacy"}}')
+    assert appmod.load_metadata() == {'a': {'id': 'a', 'title': 'legacy'}}
+    assert log_path.read_bytes() == b'{"id":"a","title":"legacy"}\n'
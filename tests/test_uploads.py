@@ -0,0 +1,119 @@
+import pytest
+
+import app as appmod
+
+PART_SIZE = 1024
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    config = appmod.app.config
+    monkeypatch.setitem(config, 'UPLOAD_FOLDER', str(tmp_path / 'videos'))
+    monkeypatch.setitem(config, 'METADATA_FILE', str(tmp_path / 'metadata.jsonl'))
+    monkeypatch.setitem(config, 'LEGACY_METADATA_FILE', str(tmp_path / 'metadata.json'))
+    monkeypatch.setitem(config, 'USERS_FILE', str(tmp_path / 'users.json'))
+    monkeypatch.setitem(config, 'UPLOAD_PART_SIZE', PART_SIZE)
+    with appmod._write_lock, appmod._store_lock:
+        appmod._metadata_cache['pending'].clear()
+        appmod._metadata_cache.update(data=None, ino=None, offset=0, rows=0,
+                                      flushed=appmod._metadata_cache['queued'])
+        appmod._users_cache.update(key=None, data=None)
+        appmod._user_index['users'] = None
+    
+    client = appmod.app.test_client()
+    client.post('/api/register', json={'name': 'Alice', 'email': 'alice@example.com',
+                                       'username': 'alice', 'password': 'secret1'})
+    assert client.post('/api/login', json={'username': 'alice', 'password': 'secret1'}).json['success']
+    yield client
+    # Write what is still queued before the paths above are restored
+    appmod.flush_metadata()
+
+
+def start_upload(client, size):
+    response = client.post('/upload/init', json={'filename': 'clip.mp4', 'size': size})
+    assert response.status_code == 200
+    return response.json['upload_id']
+
+
+def put_part(client, upload_id, part, data):
+    return client.put(f'/upload/{upload_id}/part/{part}', data=data)
+
+
+@pytest.mark.parametrize('body', [
+    {'filename': 5, 'size': 10},
+    {'filename': 'clip.mp4', 'size': True},
+    {'filename': 'clip.mp4', 'size': 0},
+    {'filename': 'clip.txt', 'size': 10},
+    [1, 2],
+])
+def test_init_rejects_bad_requests(client, body):
+    assert client.post('/upload/init', json=body).status_code == 400
+
+
+def test_finalize_with_all_parts(client):
+    data = bytes(range(256)) * 10
+    upload_id = start_upload(client, len(data))
+    # Parts may arrive in any order
+    for part in (2, 0, 1):
+        chunk = data[part * PART_SIZE:(part + 1) * PART_SIZE]
+        assert put_part(client, upload_id, part, chunk).status_code == 200
+    
+    assert client.post(f'/upload/{upload_id}/finalize').status_code == 200
+    video = appmod.load_metadata()[upload_id]
+    assert 'status' not in video and video['size_bytes'] == len(data)
+    assert client.get(f'/stream/{upload_id}').data == data
+
+
+def test_finalize_refuses_a_missing_part(client):
+    data = b'x' * (2 * PART_SIZE + 10)
+    upload_id = start_upload(client, len(data))
+    # Writing only the last part already gives the file its full size
+    assert put_part(client, upload_id, 2, data[2 * PART_SIZE:]).status_code == 200
+    
+    response = client.post(f'/upload/{upload_id}/finalize')
+    assert response.status_code == 400
+    assert appmod.load_metadata()[upload_id]['status'] == 'uploading'
+
+
+def test_short_part_is_rejected(client):
+    upload_id = start_upload(client, 2 * PART_SIZE)
+    assert put_part(client, upload_id, 0, b'x' * 100).status_code == 400
+    assert put_part(client, upload_id, 1, b'x' * PART_SIZE).status_code == 200
+    assert client.post(f'/upload/{upload_id}/finalize').status_code == 400
+
+
+def test_out_of_range_part_is_rejected(client):
+    upload_id = start_upload(client, PART_SIZE + 10)
+    assert put_part(client, upload_id, 2, b'x').status_code == 400
+    assert put_part(client, upload_id, 1, b'x' * 11).status_code == 400
+
+
+def test_unsatisfiable_range_on_live_upload(client):
+    upload_id = start_upload(client, 2 * PART_SIZE)
+    put_part(client, upload_id, 0, b'x' * PART_SIZE)
+    
+    for header in ('bytes=5000-', 'bytes=20-10'):
+        response = client.get(f'/stream/{upload_id}', headers={'Range': header})
+        assert response.status_code == 416
+        assert response.headers['Content-Range'] == f'bytes */{2 * PART_SIZE}'
+    
+    response = client.get(f'/stream/{upload_id}', headers={'Range': 'bytes=10-19'})
+    assert response.status_code == 206
+    assert response.data == b'x' * 10
+
+
+def test_part_after_delete_is_not_found(client):
+    upload_id = start_upload(client, 2 * PART_SIZE)
+    assert put_part(client, upload_id, 0, b'x' * PART_SIZE).status_code == 200
+    assert client.delete(f'/delete/{upload_id}').status_code == 200
+    
+    assert put_part(client, upload_id, 1, b'x' * PART_SIZE).status_code == 404
+    assert client.post(f'/upload/{upload_id}/finalize').status_code == 404
+
+
+def test_abandoned_upload_expires(client, monkeypatch):
+    upload_id = start_upload(client, 2 * PART_SIZE)
+    monkeypatch.setattr(appmod, 'UPLOAD_EXPIRY', -1)
+    
+    assert client.get('/videos/all').json == []
+    assert upload_id not in appmod.load_metadata()